@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+"""统计 `manage.py check` 的模块导入耗时（基于 python -X importtime）。
+
+用法: python benchmarks/importtime.py [--runs N] [--top N]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 重点关注的重量级依赖
+WATCHED = ('apscheduler', 'django_apscheduler', 'django.core.mail', 'smtplib', 'email')
+
+
+def run_importtime():
+    """运行 manage.py check 并返回 [(模块名, 累计微秒)]"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', 'manage.py', 'check'],
+        cwd=BASE_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"manage.py check 执行失败 (退出码 {result.returncode}):\n{result.stderr[-2000:]}")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line.split('|', 2)
+        # 保留缩进以区分嵌套层级（'|' 后固定有一个空格）
+        rows.append((name[1:].rstrip(), int(cumulative_us)))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=1, help="运行次数，报告每次耗时和中位数")
+    parser.add_argument('--top', type=int, default=15, help="显示累计耗时最多的前 N 个模块")
+    args = parser.parse_args()
+
+    totals = []
+    for _ in range(args.runs):
+        rows = run_importtime()
+        # 只统计顶层模块（缩进最浅）的累计时间，避免重复计算
+        totals.append(sum(us for name, us in rows if not name.startswith(' ')) / 1000)
+
+    print("每次运行总导入耗时 (ms): " + ", ".join(f"{t:.1f}" for t in totals))
+    print(f"中位数: {statistics.median(totals):.1f} ms  最小: {min(totals):.1f} ms  最大: {max(totals):.1f} ms")
+
+    # 以下为最后一次运行的明细
+    print(f"\n最后一次运行明细（总导入耗时 {totals[-1]:.1f} ms）")
+    print("\n重量级依赖:")
+    for prefix in WATCHED:
+        # 包本身可能先于子模块被导入，按前缀匹配并取最大累计耗时
+        loaded = [us for name, us in rows
+                  if name.strip() == prefix or name.strip().startswith(prefix + '.')]
+        status = f"{max(loaded) / 1000:.1f} ms（{len(loaded)} 个模块）" if loaded else "未加载"
+        print(f"  {prefix:<20} {status}")
+
+    print(f"\n累计耗时前 {args.top} 的模块:")
+    for name, us in sorted(rows, key=lambda r: r[1], reverse=True)[:args.top]:
+        print(f"  {us / 1000:8.1f} ms  {name.strip()}")
+
+
+if __name__ == '__main__':
+    main()
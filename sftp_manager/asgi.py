@@ -10,11 +10,10 @@ https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 # sftp_manager/wsgi.py 补充
 import os
 from django.core.wsgi import get_wsgi_application
-from sftp_web.views import start_scheduler
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sftp_manager.settings')
+# 标记为 Web 服务进程，调度器由 SftpWebConfig.ready() 启动
+os.environ.setdefault('SFTP_SERVER_PROCESS', 'true')
 
 application = get_wsgi_application()
 
-# 启动调度器（仅在WSGI启动时执行一次）
-start_scheduler()
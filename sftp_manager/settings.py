@@ -15,10 +15,15 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
 
-    'sftp_web',
-    'django_apscheduler',
+    'sftp_web.apps.SftpWebConfig',
 ]
 
+# 调度器使用内存 jobstore，django_apscheduler 仅用于后台查看任务记录；
+# 其模型会在启动时导入 APScheduler，因此默认不加载
+SFTP_DJANGO_APSCHEDULER_ENABLED = False
+if SFTP_DJANGO_APSCHEDULER_ENABLED:
+    INSTALLED_APPS.append('django_apscheduler')
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',  # Admin必需
@@ -57,8 +62,23 @@ CRONJOBS = [
     # 每天10:30执行检查任务（可前端配置时间）
     ('30 10 * * *', 'sftp_app.tasks.check_sftp_users', '>> sftp_cron.log 2>&1')
 ]
+# 子系统开关（在 SftpWebConfig.ready() 中读取并校验，必须为 True/False）
+SFTP_SCHEDULER_ENABLED = True  # 是否在本进程启动租期检查调度器
+SFTP_LEASE_MAIL_ENABLED = True  # 是否发送租期到期提醒邮件
+# 多 worker 部署时只有持有此文件锁的进程运行调度器
+SFTP_SCHEDULER_LOCK_FILE = os.path.join(BASE_DIR, 'sftp_scheduler.lock')
+# 目录占用扫描：每个目录保留的最大文件数、进程池大小（None 为 CPU 核数）
+SFTP_USAGE_TOP_N = 10
+SFTP_USAGE_SCAN_WORKERS = None
 WSGI_APPLICATION = 'sftp_manager.wsgi.application'
 
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+    }
+}
+
 LANGUAGE_CODE = 'zh-hans'
 TIME_ZONE = 'Asia/Shanghai'
 USE_I18N = True
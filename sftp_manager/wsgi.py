@@ -12,5 +12,7 @@ import os
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sftp_manager.settings')
+# 标记为 Web 服务进程，允许 SftpWebConfig.ready() 启动调度器
+os.environ.setdefault('SFTP_SERVER_PROCESS', 'true')
 
 application = get_wsgi_application()
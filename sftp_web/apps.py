@@ -0,0 +1,30 @@
+from django.apps import AppConfig
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+
+class SftpWebConfig(AppConfig):
+    name = 'sftp_web'
+    verbose_name = "SFTP管理"
+
+    # 子系统开关，在 ready() 中读取并校验
+    scheduler_enabled = True
+    lease_mail_enabled = True
+
+    def ready(self):
+        """应用加载完成后按配置启动各子系统"""
+        self.scheduler_enabled = self._read_switch('SFTP_SCHEDULER_ENABLED')
+        self.lease_mail_enabled = self._read_switch('SFTP_LEASE_MAIL_ENABLED')
+
+        from .scheduler import should_start_scheduler, start_scheduler
+
+        if self.scheduler_enabled and should_start_scheduler():
+            start_scheduler()
+
+    @staticmethod
+    def _read_switch(name):
+        """读取布尔开关，未配置时默认启用"""
+        value = getattr(settings, name, True)
+        if not isinstance(value, bool):
+            raise ImproperlyConfigured(f"{name} 必须为 True 或 False，当前为 {value!r}")
+        return value
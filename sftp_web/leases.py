@@ -0,0 +1,151 @@
+from datetime import timedelta
+from django.utils import timezone
+from django.apps import apps
+from django.conf import settings
+import logging
+
+from .models import SFTPAccount, SFTPLeaseSettings, DirectoryLease, DirectoryUsage
+from .utils import execute_script, format_bytes
+
+logger = logging.getLogger(__name__)
+
+
+def check_and_process_leases():
+    """检查并处理即将到期和已到期的目录租期"""
+    from django.db import connection
+
+    # 修复可能的数据库连接问题
+    connection.close()
+
+    try:
+        logger.info("开始执行租期检查任务...")
+
+        # 获取全局租期设置
+        try:
+            lease_settings = SFTPLeaseSettings.objects.first()
+        except Exception as e:
+            logger.error(f"获取租期设置失败: {str(e)}")
+            lease_settings = None
+
+        if not lease_settings or not lease_settings.enabled:
+            logger.info("租期管理已禁用，跳过本次检查")
+            return
+
+        now = timezone.now()
+        notice_threshold = now + timedelta(days=lease_settings.default_notice_days)
+
+        # 1. 处理即将到期的目录(发送提醒)
+        if apps.get_app_config('sftp_web').lease_mail_enabled:
+            expiring_leases = DirectoryLease.objects.filter(
+                is_active=True,
+                notice_sent=False,
+                end_date__lte=notice_threshold,
+                end_date__gt=now
+            )
+
+            logger.info(f"发现 {expiring_leases.count()} 个即将到期的目录")
+
+            for lease in expiring_leases:
+                try:
+                    send_lease_notice_email(lease)
+                    lease.notice_sent = True
+                    lease.save()
+                    logger.info(
+                        f"已发送租期提醒给 {lease.manager} (目录: {lease.username}，剩余 {lease.days_remaining()} 天)")
+                except Exception as e:
+                    logger.error(f"发送提醒邮件失败 {lease.username}: {str(e)}")
+        else:
+            logger.info("租期提醒邮件已禁用，跳过提醒")
+
+        # 2. 处理已到期的目录
+        expired_leases = DirectoryLease.objects.filter(
+            is_active=True,
+            end_date__lte=now
+        )
+
+        logger.info(f"发现 {expired_leases.count()} 个已到期的目录")
+
+        for lease in expired_leases:
+            try:
+                # 调用删除脚本
+                success = delete_external_directory(lease.username)
+                if success:
+                    lease.is_active = False
+                    lease.save()
+                    logger.info(f"成功删除过期目录: {lease.username}")
+                else:
+                    logger.warning(f"删除目录失败: {lease.username}，将在下次重试")
+            except Exception as e:
+                logger.error(f"处理过期目录 {lease.username} 时出错: {str(e)}")
+
+        logger.info("租期检查任务完成")
+
+    except Exception as e:
+        logger.exception(f"租期检查过程中出错: {str(e)}")
+
+
+def send_lease_notice_email(lease):
+    """发送租期即将到期的通知邮件"""
+    # 邮件模块仅在真正发送时加载
+    from django.core.mail import send_mail
+
+    subject = f"[SFTP系统] 外部目录租期提醒: {lease.username}"
+
+    message = (
+        f"尊敬的管理员 {lease.manager}：\n\n"
+        f"您管理的外部SFTP目录 '{lease.username}' 将在 {lease.days_remaining()} 天后到期（{lease.end_date.strftime('%Y-%m-%d')}）。\n"
+        f"到期后该目录将被自动删除，请及时通知外部用户备份重要数据。\n\n"
+    )
+
+    # 附上目录占用情况，方便提前清理
+    usage = DirectoryUsage.objects.filter(username=lease.username).first()
+    if usage:
+        message += f"当前占用 {format_bytes(usage.total_size)}，共 {usage.file_count} 个文件。"
+        if usage.largest_files:
+            message += "最大的文件：\n"
+            for item in usage.largest_files:
+                message += f"  {format_bytes(item['size'])}  {item['path']}\n"
+        message += "\n"
+
+    message += (
+        f"如需延长租期，请登录SFTP管理系统进行操作。\n\n"
+        f"SFTP管理团队"
+    )
+
+    try:
+        # 获取管理员邮箱（假设格式为 username@company.com）
+        manager_email = f"{lease.manager}@company.com"  # 实际应用中应从用户模型获取
+
+        send_mail(
+            subject,
+            message,
+            settings.DEFAULT_FROM_EMAIL,
+            [manager_email],
+            fail_silently=False,
+        )
+        logger.info(f"成功发送租期提醒邮件到 {manager_email}")
+    except Exception as e:
+        logger.error(f"发送邮件失败: {str(e)}")
+        raise
+
+
+def delete_external_directory(username):
+    """调用外部脚本删除目录"""
+    try:
+        result = execute_script(['del-user', username])
+
+        if 'error' in result:
+            logger.error(f"删除目录失败 {username}: {result['error']}")
+            return False
+
+        # 删除数据库记录
+        SFTPAccount.objects.filter(username=username).delete()
+        DirectoryUsage.objects.filter(username=username).delete()
+        DirectoryLease.objects.filter(username=username).update(is_active=False)
+
+        logger.info(f"成功删除外部目录: {username}")
+        return True
+
+    except Exception as e:
+        logger.exception(f"执行删除操作时出错 {username}: {str(e)}")
+        return False
@@ -56,4 +56,19 @@ class DirectoryLease(models.Model):
         if not self.is_active or self.end_date < timezone.now():
             return 0
         delta = self.end_date - timezone.now()
-        return delta.days
\ No newline at end of file
+        return delta.days
+
+class DirectoryUsage(models.Model):
+    """目录占用信息（由定时扫描生成）"""
+    username = models.CharField(max_length=100, unique=True, verbose_name="关联用户名")
+    total_size = models.BigIntegerField(default=0, verbose_name="总大小(字节)")
+    file_count = models.IntegerField(default=0, verbose_name="文件数")
+    largest_files = models.JSONField(default=list, verbose_name="最大文件列表")
+    scanned_at = models.DateTimeField(default=timezone.now, verbose_name="扫描时间")
+
+    class Meta:
+        verbose_name = "目录占用"
+        verbose_name_plural = "目录占用"
+
+    def __str__(self):
+        return f"{self.username} - {self.total_size} 字节"
@@ -0,0 +1,209 @@
+import os
+import heapq
+import logging
+import threading
+
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# 同一进程内同时只允许一次全量扫描（定时任务与手动触发共用）
+_scan_lock = threading.Lock()
+
+
+def _scan_tree(path, top_n):
+    """扫描单个子树，返回 (总大小, 文件数, 最大文件堆)
+
+    在子进程中执行，不能访问数据库。最大文件使用容量为 top_n 的最小堆维护，
+    内存占用与文件总数无关。
+    """
+    total_size = 0
+    file_count = 0
+    largest = []  # [(size, path)] 最小堆
+
+    stack = [path]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            size = entry.stat(follow_symlinks=False).st_size
+                            total_size += size
+                            file_count += 1
+                            if len(largest) < top_n:
+                                heapq.heappush(largest, (size, entry.path))
+                            elif size > largest[0][0]:
+                                heapq.heapreplace(largest, (size, entry.path))
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+
+    return total_size, file_count, largest
+
+
+def _scan_root(path):
+    """列出根目录：返回 (一级子目录列表, 根目录下文件大小, 根目录下文件数, [(size, path)])
+
+    根目录不存在、不是目录或无法读取时抛出 OSError。
+    """
+    subtrees = []
+    total_size = 0
+    file_count = 0
+    files = []
+
+    with os.scandir(path) as entries:
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subtrees.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    size = entry.stat(follow_symlinks=False).st_size
+                    total_size += size
+                    file_count += 1
+                    files.append((size, entry.path))
+            except OSError:
+                continue
+
+    return subtrees, total_size, file_count, files
+
+
+def scan_directories(paths, top_n=None, max_workers=None):
+    """并行扫描多个目录，统计每个目录的总大小、文件数和最大的 top_n 个文件
+
+    所有目录的一级子目录共用一个进程池，根目录下的文件在当前进程统计。
+    返回 {path: 结果字典}；根目录无法读取的路径对应 None。
+    """
+    if top_n is None:
+        top_n = getattr(settings, 'SFTP_USAGE_TOP_N', 10)
+    if max_workers is None:
+        max_workers = getattr(settings, 'SFTP_USAGE_SCAN_WORKERS', None)
+
+    results = {}
+    largest = {}
+    tasks = []  # [(根目录, 子目录)]
+
+    for path in paths:
+        try:
+            subtrees, total_size, file_count, files = _scan_root(path)
+        except OSError as e:
+            logger.error(f"扫描目录失败 {path}: {str(e)}")
+            results[path] = None
+            continue
+
+        results[path] = {'total_size': total_size, 'file_count': file_count, 'largest_files': []}
+        largest[path] = files
+        tasks.extend((path, subtree) for subtree in subtrees)
+
+    if tasks:
+        # 进程池相关模块较重，仅在真正扫描时导入
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+
+        # 调用方通常是多线程进程（调度器线程、请求线程），不能使用 fork
+        mp_context = multiprocessing.get_context('forkserver')
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=mp_context) as executor:
+            futures = {
+                executor.submit(_scan_tree, subtree, top_n): (path, subtree)
+                for path, subtree in tasks
+            }
+            for future in as_completed(futures):
+                path, subtree = futures[future]
+                try:
+                    size, count, files = future.result()
+                except Exception as e:
+                    # 子树扫描失败时整个目录视为失败，保留上次结果
+                    logger.error(f"扫描子目录失败 {subtree}: {str(e)}")
+                    results[path] = None
+                    continue
+                if results[path] is None:
+                    continue
+                results[path]['total_size'] += size
+                results[path]['file_count'] += count
+                largest[path].extend(files)
+
+    for path, files in largest.items():
+        if results[path] is None:
+            continue
+        results[path]['largest_files'] = [
+            {'path': os.path.relpath(fp, path), 'size': size}
+            for size, fp in heapq.nlargest(top_n, files)
+        ]
+    return results
+
+
+def scan_directory(path, top_n=None, max_workers=None):
+    """扫描单个目录，根目录无法读取时返回 None"""
+    return scan_directories([path], top_n=top_n, max_workers=max_workers)[path]
+
+
+def usage_scan_running():
+    """当前进程是否有目录占用扫描正在执行"""
+    return _scan_lock.locked()
+
+
+def update_directory_usage():
+    """扫描所有外部目录并保存占用信息
+
+    已有扫描在运行时直接返回 None。
+    """
+    if not _scan_lock.acquire(blocking=False):
+        logger.warning("已有目录占用扫描正在执行，跳过本次扫描")
+        return None
+
+    from django.db import connection
+
+    # 修复可能的数据库连接问题
+    connection.close()
+
+    try:
+        return _update_directory_usage()
+    finally:
+        connection.close()
+        _scan_lock.release()
+
+
+def _update_directory_usage():
+    from .models import DirectoryUsage
+    from .utils import execute_script
+
+    result = execute_script(['list-users'])
+    if 'error' in result:
+        logger.error(f"获取用户列表失败: {result['error']}")
+        return 0
+
+    external_dirs = [u['username'] for u in result.get('users', []) if u.get('type') == 'external']
+    logger.info(f"开始扫描 {len(external_dirs)} 个外部目录的占用情况...")
+
+    # 清理已不存在的目录的占用记录
+    DirectoryUsage.objects.exclude(username__in=external_dirs).delete()
+
+    paths = {f"/home/{username}": username for username in external_dirs}
+    usages = scan_directories(list(paths))
+
+    for path, usage in usages.items():
+        username = paths[path]
+        if usage is None:
+            # 保留上次的扫描结果，避免误报为空目录
+            logger.warning(f"目录 {username} 无法读取，保留上次扫描结果")
+            continue
+        try:
+            DirectoryUsage.objects.update_or_create(
+                username=username,
+                defaults={
+                    'total_size': usage['total_size'],
+                    'file_count': usage['file_count'],
+                    'largest_files': usage['largest_files'],
+                    'scanned_at': timezone.now(),
+                }
+            )
+        except Exception as e:
+            logger.error(f"保存目录 {username} 占用信息时出错: {str(e)}")
+
+    logger.info("目录占用扫描完成")
+    return len(external_dirs)
@@ -0,0 +1,139 @@
+import os
+import sys
+import atexit
+import logging
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# 调度器实例（首次启动时才创建，避免在每个进程导入 APScheduler）
+scheduler = None
+
+# 启动调度器的进程 PID（gunicorn --preload 时 fork 出的 worker 继承了
+# scheduler.running，但没有继承调度器线程）
+_scheduler_pid = None
+
+# 调度器进程锁文件句柄（保持打开以持有锁）
+_lock_file = None
+
+# wsgi.py / asgi.py 设置此环境变量，标记当前进程为 Web 服务进程
+SERVER_PROCESS_ENV = 'SFTP_SERVER_PROCESS'
+
+
+def should_start_scheduler():
+    """判断当前进程是否应该拥有调度器
+
+    只有 Web 服务进程（WSGI/ASGI 或 runserver 实际处理请求的进程）启动调度器，
+    其余管理命令（migrate、shell、loaddata、自定义命令等）一律不启动。
+    SFTP_SCHEDULER_ENABLED 开关由 SftpWebConfig.ready() 处理。
+    """
+    if os.environ.get(SERVER_PROCESS_ENV) == 'true':
+        return _acquire_lock()
+
+    # manage.py / django-admin / python -m django 均以子命令作为 argv[1]
+    if len(sys.argv) > 1 and sys.argv[1] == 'runserver':
+        # 启用自动重载时只在子进程（RUN_MAIN）中启动
+        if '--noreload' in sys.argv or os.environ.get('RUN_MAIN') == 'true':
+            return _acquire_lock()
+
+    return False
+
+
+def _acquire_lock():
+    """多 worker 部署时，只有拿到文件锁的进程启动调度器"""
+    global _lock_file
+
+    lock_path = getattr(settings, 'SFTP_SCHEDULER_LOCK_FILE', None)
+    if not lock_path:
+        return True
+
+    try:
+        import fcntl
+    except ImportError:
+        return True
+
+    try:
+        _lock_file = open(lock_path, 'w')
+        fcntl.flock(_lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        if _lock_file is not None:
+            _lock_file.close()
+            _lock_file = None
+        logger.info("调度器已在其他进程中运行，当前进程跳过")
+        return False
+
+
+def start_scheduler():
+    """启动APS调度器（适配新版APScheduler）"""
+    global scheduler, _scheduler_pid
+
+    try:
+        # APScheduler 相关导入（延迟到真正启动时）
+        from apscheduler.schedulers.background import BackgroundScheduler
+        from apscheduler.triggers.cron import CronTrigger
+
+        from .leases import check_and_process_leases
+        from .scanner import update_directory_usage
+
+        if scheduler is None:
+            scheduler = BackgroundScheduler(timezone=settings.TIME_ZONE)
+            # 确保程序退出时正确关闭调度器
+            atexit.register(shutdown_scheduler)
+
+        # 清空已有任务（避免重复添加）
+        scheduler.remove_all_jobs()
+
+        # 直接添加任务（无需手动管理 jobstore）
+        scheduler.add_job(
+            check_and_process_leases,
+            trigger=CronTrigger(hour=2, minute=0),
+            id="daily_lease_check",
+            max_instances=1,
+            replace_existing=True,
+            misfire_grace_time=3600  # 1小时的宽限期
+        )
+
+        # 在租期检查前扫描目录占用，方便管理员提前清理
+        scheduler.add_job(
+            update_directory_usage,
+            trigger=CronTrigger(hour=1, minute=0),
+            id="daily_usage_scan",
+            max_instances=1,
+            replace_existing=True,
+            misfire_grace_time=3600
+        )
+
+        # 启动调度器（仅启动一次）
+        if not scheduler.running:
+            scheduler.start()
+            _scheduler_pid = os.getpid()
+            logger.info("APScheduler已启动，租期管理任务已注册")
+
+    except Exception as e:
+        logger.error(f"启动调度器失败: {str(e)}")
+
+
+def shutdown_scheduler():
+    """关闭调度器"""
+    if scheduler is not None and scheduler.running:
+        scheduler.shutdown()
+
+
+def scheduler_owned():
+    """当前进程中的调度器是否真正在运行"""
+    return scheduler is not None and scheduler.running and _scheduler_pid == os.getpid()
+
+
+def run_job_now(func, job_id):
+    """立即在后台执行一次任务，不阻塞调用方
+
+    当前进程持有调度器时作为一次性任务提交；否则（调度器在其他 worker 中，
+    或本进程是从启动调度器的进程 fork 出来的）使用后台线程执行。
+    """
+    if scheduler_owned():
+        scheduler.add_job(func, id=job_id, replace_existing=True, max_instances=1)
+    else:
+        import threading
+        threading.Thread(target=func, name=job_id, daemon=True).start()
@@ -0,0 +1,315 @@
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock
+
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import scanner, scheduler
+from .leases import check_and_process_leases, delete_external_directory
+from .models import DirectoryLease, DirectoryUsage, SFTPAccount, SFTPLeaseSettings
+from .scanner import scan_directory, scan_directories, update_directory_usage
+
+
+class ScanDirectoryTests(SimpleTestCase):
+    """目录占用扫描"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.tmp.name, 'user1')
+        self._write('root.txt', 300)
+        self._write('a/small.txt', 10)
+        self._write('a/b/big.bin', 5000)
+        self._write('a/b/mid.bin', 2000)
+        self._write('c/medium.bin', 1000)
+
+        # 指向目录外大文件/目录的符号链接不应被统计
+        outside = os.path.join(self.tmp.name, 'outside')
+        os.makedirs(outside)
+        with open(os.path.join(outside, 'huge.bin'), 'wb') as f:
+            f.write(b'\0' * 100000)
+        os.symlink(os.path.join(outside, 'huge.bin'), os.path.join(self.root, 'link.bin'))
+        os.symlink(outside, os.path.join(self.root, 'a', 'linkdir'))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _write(self, relpath, size, root=None):
+        path = os.path.join(root or self.root, relpath)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(b'\0' * size)
+
+    def test_totals_and_top_n(self):
+        usage = scan_directory(self.root, top_n=3, max_workers=2)
+
+        self.assertEqual(usage['total_size'], 300 + 10 + 5000 + 2000 + 1000)
+        self.assertEqual(usage['file_count'], 5)
+        self.assertEqual(usage['largest_files'], [
+            {'path': os.path.join('a', 'b', 'big.bin'), 'size': 5000},
+            {'path': os.path.join('a', 'b', 'mid.bin'), 'size': 2000},
+            {'path': os.path.join('c', 'medium.bin'), 'size': 1000},
+        ])
+
+    def test_root_level_files_in_top_n(self):
+        usage = scan_directory(self.root, top_n=5, max_workers=2)
+
+        self.assertIn({'path': 'root.txt', 'size': 300}, usage['largest_files'])
+        self.assertEqual([f['size'] for f in usage['largest_files']], [5000, 2000, 1000, 300, 10])
+
+    def test_multiple_directories_share_pool(self):
+        other = os.path.join(self.tmp.name, 'user2')
+        self._write('x/only.bin', 42, root=other)
+
+        usages = scan_directories([self.root, other], top_n=1, max_workers=2)
+
+        self.assertEqual(usages[self.root]['largest_files'], [{'path': os.path.join('a', 'b', 'big.bin'), 'size': 5000}])
+        self.assertEqual(usages[other], {
+            'total_size': 42,
+            'file_count': 1,
+            'largest_files': [{'path': os.path.join('x', 'only.bin'), 'size': 42}],
+        })
+
+    def test_missing_root_returns_none(self):
+        self.assertIsNone(scan_directory(os.path.join(self.tmp.name, 'missing')))
+        self.assertIsNone(scan_directory(os.path.join(self.root, 'root.txt')))
+
+    def test_worker_failure_marks_root_failed(self):
+        other = os.path.join(self.tmp.name, 'user2')
+        self._write('x/only.bin', 42, root=other)
+
+        def thread_pool(max_workers=None, mp_context=None):
+            # 线程池中才能让打补丁的 _scan_tree 生效
+            return ThreadPoolExecutor(max_workers=max_workers)
+
+        def flaky_scan_tree(path, top_n):
+            if path.startswith(self.root):
+                raise RuntimeError('worker died')
+            return real_scan_tree(path, top_n)
+
+        real_scan_tree = scanner._scan_tree
+        with mock.patch('concurrent.futures.ProcessPoolExecutor', thread_pool), \
+                mock.patch('sftp_web.scanner._scan_tree', flaky_scan_tree):
+            usages = scan_directories([self.root, other], top_n=1, max_workers=2)
+
+        self.assertIsNone(usages[self.root])
+        self.assertEqual(usages[other]['total_size'], 42)
+
+
+class UpdateDirectoryUsageTests(TestCase):
+    """定时扫描结果入库"""
+
+    def setUp(self):
+        # 任务开头/结尾的 connection.close() 会打断测试事务
+        patcher = mock.patch.object(connection, 'close')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.old_scanned_at = timezone.now() - timedelta(days=1)
+        DirectoryUsage.objects.create(
+            username='user1', total_size=123, file_count=4,
+            largest_files=[{'path': 'a.bin', 'size': 100}], scanned_at=self.old_scanned_at,
+        )
+        DirectoryUsage.objects.create(username='gone', total_size=1, file_count=1)
+
+    def _run(self, usages):
+        users = {'users': [{'username': 'user1', 'type': 'external'},
+                           {'username': 'user2', 'type': 'external'},
+                           {'username': 'staff', 'type': 'internal'}]}
+        with mock.patch('sftp_web.utils.execute_script', return_value=users), \
+                mock.patch('sftp_web.scanner.scan_directories', return_value=usages):
+            return update_directory_usage()
+
+    def test_unreadable_root_keeps_previous_row(self):
+        count = self._run({
+            '/home/user1': None,
+            '/home/user2': {'total_size': 42, 'file_count': 1, 'largest_files': [{'path': 'x', 'size': 42}]},
+        })
+
+        self.assertEqual(count, 2)
+        kept = DirectoryUsage.objects.get(username='user1')
+        self.assertEqual(kept.total_size, 123)
+        self.assertEqual(kept.scanned_at, self.old_scanned_at)
+        self.assertEqual(DirectoryUsage.objects.get(username='user2').total_size, 42)
+
+    def test_updates_rows_and_removes_unlisted_directories(self):
+        self._run({
+            '/home/user1': {'total_size': 7, 'file_count': 2, 'largest_files': []},
+            '/home/user2': {'total_size': 0, 'file_count': 0, 'largest_files': []},
+        })
+
+        usage = DirectoryUsage.objects.get(username='user1')
+        self.assertEqual((usage.total_size, usage.file_count), (7, 2))
+        self.assertGreater(usage.scanned_at, self.old_scanned_at)
+        self.assertFalse(DirectoryUsage.objects.filter(username='gone').exists())
+        self.assertFalse(DirectoryUsage.objects.filter(username='staff').exists())
+
+    def test_skips_when_scan_already_running(self):
+        with scanner._scan_lock:
+            with mock.patch('sftp_web.utils.execute_script') as execute:
+                self.assertIsNone(update_directory_usage())
+        execute.assert_not_called()
+
+    def test_delete_external_directory_removes_usage(self):
+        SFTPAccount.objects.create(username='user1', manager='admin')
+        with mock.patch('sftp_web.leases.execute_script', return_value={'message': 'ok'}):
+            self.assertTrue(delete_external_directory('user1'))
+        self.assertFalse(DirectoryUsage.objects.filter(username='user1').exists())
+
+
+class DirectoryUsageApiTests(TestCase):
+    """目录占用 API"""
+
+    def setUp(self):
+        DirectoryUsage.objects.create(
+            username='user1', total_size=2048, file_count=3,
+            largest_files=[{'path': 'big.bin', 'size': 2000}],
+        )
+        DirectoryUsage.objects.create(username='user2', total_size=10, file_count=1)
+        self.user = User.objects.create_user('staff', password='pw')
+        self.admin = User.objects.create_superuser('admin', password='pw')
+
+    def test_get_requires_login(self):
+        response = self.client.get(reverse('api_get_directory_usage'), {'username': 'user1'})
+        self.assertEqual(response.status_code, 403)
+
+    def test_get_single_directory(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('api_get_directory_usage'), {'username': 'user1'})
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['total_size'], 2048)
+        self.assertEqual(data['total_size_display'], '2.0 KB')
+        self.assertEqual(data['largest_files'], [{'path': 'big.bin', 'size': 2000}])
+
+    def test_get_all_directories_sorted_by_size(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('api_get_directory_usage'))
+
+        self.assertEqual([d['username'] for d in response.json()['directories']], ['user1', 'user2'])
+
+    def test_get_unknown_directory_404(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('api_get_directory_usage'), {'username': 'missing'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_manual_scan_requires_superuser(self):
+        self.client.force_login(self.user)
+        with mock.patch('sftp_web.views.run_job_now') as run_job_now:
+            response = self.client.post(reverse('api_manual_usage_scan'))
+        self.assertEqual(response.status_code, 403)
+        run_job_now.assert_not_called()
+
+    def test_manual_scan_accepted(self):
+        self.client.force_login(self.admin)
+        with mock.patch('sftp_web.views.run_job_now') as run_job_now:
+            response = self.client.post(reverse('api_manual_usage_scan'))
+        self.assertEqual(response.status_code, 202)
+        run_job_now.assert_called_once_with(update_directory_usage, 'manual_usage_scan')
+
+    def test_manual_scan_conflict_when_running(self):
+        self.client.force_login(self.admin)
+        with scanner._scan_lock, mock.patch('sftp_web.views.run_job_now') as run_job_now:
+            response = self.client.post(reverse('api_manual_usage_scan'))
+        self.assertEqual(response.status_code, 409)
+        run_job_now.assert_not_called()
+
+
+@override_settings(SFTP_SCHEDULER_LOCK_FILE=None)
+class ShouldStartSchedulerTests(SimpleTestCase):
+    """调度器只在 Web 服务进程中启动"""
+
+    def _should_start(self, argv, env=None):
+        environ = {k: v for k, v in os.environ.items()
+                   if k not in (scheduler.SERVER_PROCESS_ENV, 'RUN_MAIN')}
+        environ.update(env or {})
+        with mock.patch('sys.argv', argv), mock.patch.dict(os.environ, environ, clear=True):
+            return scheduler.should_start_scheduler()
+
+    def test_wsgi_asgi_server_process(self):
+        self.assertTrue(self._should_start(['gunicorn'], {'SFTP_SERVER_PROCESS': 'true'}))
+
+    def test_runserver_child_process(self):
+        self.assertTrue(self._should_start(['manage.py', 'runserver'], {'RUN_MAIN': 'true'}))
+
+    def test_runserver_autoreload_parent(self):
+        self.assertFalse(self._should_start(['manage.py', 'runserver']))
+
+    def test_runserver_noreload(self):
+        self.assertTrue(self._should_start(['manage.py', 'runserver', '--noreload']))
+
+    def test_management_commands(self):
+        self.assertFalse(self._should_start(['manage.py', 'migrate']))
+        self.assertFalse(self._should_start(['manage.py', 'shell']))
+        self.assertFalse(self._should_start(['django-admin', 'loaddata', 'data.json']))
+        self.assertFalse(self._should_start(['gunicorn']))
+
+    def test_lock_contention(self):
+        import fcntl
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        lock_path = os.path.join(tmp.name, 'scheduler.lock')
+
+        with open(lock_path, 'w') as holder:
+            fcntl.flock(holder, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            with self.settings(SFTP_SCHEDULER_LOCK_FILE=lock_path):
+                self.assertFalse(self._should_start(['gunicorn'], {'SFTP_SERVER_PROCESS': 'true'}))
+            self.assertIsNone(scheduler._lock_file)
+
+        # 锁释放后可以获取
+        with self.settings(SFTP_SCHEDULER_LOCK_FILE=lock_path):
+            self.assertTrue(self._should_start(['gunicorn'], {'SFTP_SERVER_PROCESS': 'true'}))
+        scheduler._lock_file.close()
+        scheduler._lock_file = None
+
+
+class SubsystemSwitchTests(TestCase):
+    """SftpWebConfig.ready() 读取的子系统开关"""
+
+    def setUp(self):
+        self.config = apps.get_app_config('sftp_web')
+        self.addCleanup(self.config.ready)
+
+    def _ready(self):
+        with mock.patch('sftp_web.scheduler.should_start_scheduler', return_value=True), \
+                mock.patch('sftp_web.scheduler.start_scheduler') as start:
+            self.config.ready()
+        return start
+
+    @override_settings(SFTP_SCHEDULER_ENABLED=False)
+    def test_scheduler_disabled(self):
+        self._ready().assert_not_called()
+
+    @override_settings(SFTP_SCHEDULER_ENABLED=True)
+    def test_scheduler_enabled(self):
+        self._ready().assert_called_once_with()
+
+    @override_settings(SFTP_LEASE_MAIL_ENABLED='no')
+    def test_invalid_switch(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self._ready()
+
+    @override_settings(SFTP_LEASE_MAIL_ENABLED=False)
+    def test_lease_mail_disabled(self):
+        self._ready()
+        SFTPLeaseSettings.objects.create(enabled=True, default_notice_days=7)
+        lease = DirectoryLease.objects.create(
+            username='user1', manager='admin', end_date=timezone.now() + timedelta(days=3),
+        )
+
+        with mock.patch.object(connection, 'close'), \
+                mock.patch('sftp_web.leases.send_lease_notice_email') as send:
+            check_and_process_leases()
+
+        send.assert_not_called()
+        lease.refresh_from_db()
+        self.assertFalse(lease.notice_sent)
@@ -6,4 +6,6 @@ urlpatterns = [
     path('', views.sftp_manager, name='sftp_manager'),
     path('api/get_lease_info/', views.api_get_lease_info, name='api_get_lease_info'),
     path('api/manual_lease_check/', views.api_manual_lease_check, name='api_manual_lease_check'),
+    path('api/directory_usage/', views.api_get_directory_usage, name='api_get_directory_usage'),
+    path('api/manual_usage_scan/', views.api_manual_usage_scan, name='api_manual_usage_scan'),
 ]
\ No newline at end of file
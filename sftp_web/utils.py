@@ -0,0 +1,65 @@
+import subprocess
+import json
+import os
+import logging
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def execute_script(command_args):
+    """执行SFTP管理脚本"""
+    try:
+        full_command = ['sudo', 'python3', settings.SCRIPT_PATH] + command_args
+        result = subprocess.run(
+            full_command,
+            capture_output=True,
+            text=True,
+            timeout=30
+        )
+
+        if result.returncode == 0:
+            try:
+                return json.loads(result.stdout)
+            except json.JSONDecodeError:
+                return {'message': result.stdout.strip()}
+        else:
+            error_msg = result.stderr.strip() or result.stdout.strip()
+            logger.error(f"脚本执行失败: {' '.join(full_command)} - {error_msg}")
+            return {'error': error_msg}
+    except Exception as e:
+        logger.error(f"执行脚本时发生异常: {str(e)}")
+        return {'error': str(e)}
+
+
+def format_bytes(bytes_size):
+    """将字节转换为人类可读格式"""
+    if bytes_size < 1024:
+        return f"{bytes_size} B"
+    elif bytes_size < 1024 * 1024:
+        return f"{bytes_size / 1024:.1f} KB"
+    elif bytes_size < 1024 * 1024 * 1024:
+        return f"{bytes_size / (1024 * 1024):.1f} MB"
+    else:
+        return f"{bytes_size / (1024 * 1024 * 1024):.1f} GB"
+
+
+def get_directory_size(path):
+    """获取目录大小（安全方式）"""
+    try:
+        if not os.path.exists(path) or not os.path.isdir(path):
+            return 0
+
+        total_size = 0
+        for dirpath, dirnames, filenames in os.walk(path):
+            for f in filenames:
+                fp = os.path.join(dirpath, f)
+                try:
+                    total_size += os.path.getsize(fp)
+                except (OSError, FileNotFoundError):
+                    continue
+        return total_size
+    except Exception as e:
+        logger.error(f"获取目录大小失败: {str(e)}")
+        return 0
@@ -1,247 +1,19 @@
-import subprocess
-import json
-import os
-from datetime import datetime, timedelta
+from datetime import datetime
 from django.shortcuts import render
-from django.contrib import messages
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.utils import timezone
-from django.core.mail import send_mail
-from django.conf import settings
-from django.db import connection
 import logging
 
-# APScheduler 相关导入
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.cron import CronTrigger
-from django_apscheduler.jobstores import DjangoJobStore, register_events, register_job
-
 # 模型导入
-from .models import SFTPAccount, SFTPLeaseSettings, DirectoryLease
+from .models import SFTPAccount, DirectoryLease, DirectoryUsage
+from .leases import check_and_process_leases, delete_external_directory
+from .scanner import update_directory_usage, usage_scan_running
+from .scheduler import run_job_now
+from .utils import execute_script, format_bytes, get_directory_size
 
 logger = logging.getLogger(__name__)
 
-# 创建全局调度器实例
-scheduler = BackgroundScheduler(timezone=settings.TIME_ZONE)
-
-
-def start_scheduler():
-    """启动APS调度器（适配新版APScheduler）"""
-    try:
-        # 清空已有任务（避免重复添加）
-        scheduler.remove_all_jobs()
-
-        # 直接添加任务（无需手动管理 jobstore）
-        scheduler.add_job(
-            check_and_process_leases,
-            trigger=CronTrigger(hour=2, minute=0),
-            id="daily_lease_check",
-            max_instances=1,
-            replace_existing=True,
-            misfire_grace_time=3600  # 1小时的宽限期
-        )
-
-        # 启动调度器（仅启动一次）
-        if not scheduler.running:
-            scheduler.start()
-            logger.info("APScheduler已启动，租期管理任务已注册")
-
-    except Exception as e:
-        logger.error(f"启动调度器失败: {str(e)}")
-
-
-def check_and_process_leases():
-    """检查并处理即将到期和已到期的目录租期"""
-    from django.db import connection
-
-    # 修复可能的数据库连接问题
-    connection.close()
-
-    try:
-        logger.info("开始执行租期检查任务...")
-
-        # 获取全局租期设置
-        try:
-            lease_settings = SFTPLeaseSettings.objects.first()
-        except Exception as e:
-            logger.error(f"获取租期设置失败: {str(e)}")
-            lease_settings = None
-
-        if not lease_settings or not lease_settings.enabled:
-            logger.info("租期管理已禁用，跳过本次检查")
-            return
-
-        now = timezone.now()
-        notice_threshold = now + timedelta(days=lease_settings.default_notice_days)
-
-        # 1. 处理即将到期的目录(发送提醒)
-        expiring_leases = DirectoryLease.objects.filter(
-            is_active=True,
-            notice_sent=False,
-            end_date__lte=notice_threshold,
-            end_date__gt=now
-        )
-
-        logger.info(f"发现 {expiring_leases.count()} 个即将到期的目录")
-
-        for lease in expiring_leases:
-            try:
-                send_lease_notice_email(lease)
-                lease.notice_sent = True
-                lease.save()
-                logger.info(
-                    f"已发送租期提醒给 {lease.manager} (目录: {lease.username}，剩余 {lease.days_remaining()} 天)")
-            except Exception as e:
-                logger.error(f"发送提醒邮件失败 {lease.username}: {str(e)}")
-
-        # 2. 处理已到期的目录
-        expired_leases = DirectoryLease.objects.filter(
-            is_active=True,
-            end_date__lte=now
-        )
-
-        logger.info(f"发现 {expired_leases.count()} 个已到期的目录")
-
-        for lease in expired_leases:
-            try:
-                # 调用删除脚本
-                success = delete_external_directory(lease.username)
-                if success:
-                    lease.is_active = False
-                    lease.save()
-                    logger.info(f"成功删除过期目录: {lease.username}")
-                else:
-                    logger.warning(f"删除目录失败: {lease.username}，将在下次重试")
-            except Exception as e:
-                logger.error(f"处理过期目录 {lease.username} 时出错: {str(e)}")
-
-        logger.info("租期检查任务完成")
-
-    except Exception as e:
-        logger.exception(f"租期检查过程中出错: {str(e)}")
-
-
-def send_lease_notice_email(lease):
-    """发送租期即将到期的通知邮件"""
-    subject = f"[SFTP系统] 外部目录租期提醒: {lease.username}"
-
-    lease_settings = SFTPLeaseSettings.objects.first()
-
-    context = {
-        'username': lease.username,
-        'manager': lease.manager,
-        'days_remaining': lease.days_remaining(),
-        'end_date': lease.end_date.strftime('%Y-%m-%d'),
-        'notice_days': lease_settings.default_notice_days if lease_settings else 7,
-    }
-
-    message = (
-        f"尊敬的管理员 {lease.manager}：\n\n"
-        f"您管理的外部SFTP目录 '{lease.username}' 将在 {lease.days_remaining()} 天后到期（{lease.end_date.strftime('%Y-%m-%d')}）。\n"
-        f"到期后该目录将被自动删除，请及时通知外部用户备份重要数据。\n\n"
-        f"如需延长租期，请登录SFTP管理系统进行操作。\n\n"
-        f"SFTP管理团队"
-    )
-
-    try:
-        # 获取管理员邮箱（假设格式为 username@company.com）
-        manager_email = f"{lease.manager}@company.com"  # 实际应用中应从用户模型获取
-
-        send_mail(
-            subject,
-            message,
-            settings.DEFAULT_FROM_EMAIL,
-            [manager_email],
-            fail_silently=False,
-        )
-        logger.info(f"成功发送租期提醒邮件到 {manager_email}")
-    except Exception as e:
-        logger.error(f"发送邮件失败: {str(e)}")
-        raise
-
-
-def delete_external_directory(username):
-    """调用外部脚本删除目录"""
-    try:
-        result = execute_script(['del-user', username])
-
-        if 'error' in result:
-            logger.error(f"删除目录失败 {username}: {result['error']}")
-            return False
-
-        # 删除数据库记录
-        SFTPAccount.objects.filter(username=username).delete()
-        DirectoryLease.objects.filter(username=username).update(is_active=False)
-
-        logger.info(f"成功删除外部目录: {username}")
-        return True
-
-    except Exception as e:
-        logger.exception(f"执行删除操作时出错 {username}: {str(e)}")
-        return False
-
-
-# 初始化调度器 (在模块加载时)
-start_scheduler()
-
-
-def execute_script(command_args):
-    """执行SFTP管理脚本"""
-    try:
-        full_command = ['sudo', 'python3', settings.SCRIPT_PATH] + command_args
-        result = subprocess.run(
-            full_command,
-            capture_output=True,
-            text=True,
-            timeout=30
-        )
-
-        if result.returncode == 0:
-            try:
-                return json.loads(result.stdout)
-            except json.JSONDecodeError:
-                return {'message': result.stdout.strip()}
-        else:
-            error_msg = result.stderr.strip() or result.stdout.strip()
-            logger.error(f"脚本执行失败: {' '.join(full_command)} - {error_msg}")
-            return {'error': error_msg}
-    except Exception as e:
-        logger.error(f"执行脚本时发生异常: {str(e)}")
-        return {'error': str(e)}
-
-
-def format_bytes(bytes_size):
-    """将字节转换为人类可读格式"""
-    if bytes_size < 1024:
-        return f"{bytes_size} B"
-    elif bytes_size < 1024 * 1024:
-        return f"{bytes_size / 1024:.1f} KB"
-    elif bytes_size < 1024 * 1024 * 1024:
-        return f"{bytes_size / (1024 * 1024):.1f} MB"
-    else:
-        return f"{bytes_size / (1024 * 1024 * 1024):.1f} GB"
-
-
-def get_directory_size(path):
-    """获取目录大小（安全方式）"""
-    try:
-        if not os.path.exists(path) or not os.path.isdir(path):
-            return 0
-
-        total_size = 0
-        for dirpath, dirnames, filenames in os.walk(path):
-            for f in filenames:
-                fp = os.path.join(dirpath, f)
-                try:
-                    total_size += os.path.getsize(fp)
-                except (OSError, FileNotFoundError):
-                    continue
-        return total_size
-    except Exception as e:
-        logger.error(f"获取目录大小失败: {str(e)}")
-        return 0
-
 
 def sftp_manager(request):
     context = {
@@ -264,10 +36,15 @@ def sftp_manager(request):
         context['internal_users'] = [u for u in all_users if u.get('type') == 'internal']
         context['external_dirs'] = [u for u in all_users if u.get('type') == 'external']
 
-        # 获取目录大小和状态
+        # 获取目录大小和状态（优先使用定时扫描的结果）
+        usage_sizes = dict(DirectoryUsage.objects.filter(
+            username__in=[u['username'] for u in context['external_dirs']]
+        ).values_list('username', 'total_size'))
         for user in context['external_dirs']:
-            path = f"/home/{user['username']}"
-            user['size'] = format_bytes(get_directory_size(path))
+            size = usage_sizes.get(user['username'])
+            if size is None:
+                size = get_directory_size(f"/home/{user['username']}")
+            user['size'] = format_bytes(size)
             user['path'] = f"/{user['username']}/"
             user['readonly'] = user.get('readonly', False)
             # 获取管理员
@@ -438,7 +215,43 @@ def api_manual_lease_check(request):
     return JsonResponse({'error': '仅允许管理员POST请求'}, status=403)
 
 
-# 确保程序退出时正确关闭调度器
-import atexit
+@csrf_exempt
+def api_get_directory_usage(request):
+    """API接口：获取目录占用信息（总大小、文件数、最大文件）"""
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': '请先登录'}, status=403)
+    if request.method == 'GET':
+        username = request.GET.get('username')
+        usages = DirectoryUsage.objects.order_by('-total_size')
+        if username:
+            usages = usages.filter(username=username)
+            if not usages.exists():
+                return JsonResponse({'error': '占用记录不存在，请等待下次扫描'}, status=404)
+
+        data = [
+            {
+                'username': usage.username,
+                'total_size': usage.total_size,
+                'total_size_display': format_bytes(usage.total_size),
+                'file_count': usage.file_count,
+                'largest_files': usage.largest_files,
+                'scanned_at': timezone.localtime(usage.scanned_at).strftime('%Y-%m-%d %H:%M:%S'),
+            }
+            for usage in usages
+        ]
+        return JsonResponse(data[0] if username else {'directories': data})
+    return JsonResponse({'error': '仅支持GET请求'}, status=405)
+
 
-atexit.register(lambda: scheduler.shutdown() if scheduler.running else None)
\ No newline at end of file
+@csrf_exempt
+def api_manual_usage_scan(request):
+    """API接口：手动触发目录占用扫描"""
+    if request.method == 'POST' and request.user.is_superuser:
+        if usage_scan_running():
+            return JsonResponse({'error': '目录占用扫描正在执行，请稍后再试'}, status=409)
+        try:
+            run_job_now(update_directory_usage, 'manual_usage_scan')
+            return JsonResponse({'success': True, 'message': '目录占用扫描已在后台开始'}, status=202)
+        except Exception as e:
+            return JsonResponse({'error': str(e)}, status=500)
+    return JsonResponse({'error': '仅允许管理员POST请求'}, status=403)